@@ -7,43 +7,48 @@ class SymbolResult(Enum):
 # An improved version of the EnvironmentManager that can manage a separate environment for
 # each function as it executes, and has handling for nested blocks within functions
 # (so variables can go out of scope once a block enters/exits).
-# The internal data structure is essentially a stack (via a python list) of environments
-# where each environment on the stack is a list of one or more dictionaries that map a
-# variable name to a type/value. We need more than one dictionary to accomodate nested
-# blocks in functions.
+# The internal data structure is essentially a stack (via a python list) of environments,
+# one per active function call. Rather than keeping a dictionary per nested block and searching
+# them innermost-first, each environment keeps a single flat dictionary that maps a variable
+# name to the stack of its bindings (innermost binding last), plus a list with the set of names
+# each block introduced. A lookup is then one dictionary access no matter how deeply blocks are
+# nested, and leaving a block pops the bindings it introduced.
 # If f() calls g() calls h() then while we're in function h, our stack would have
-# three items on it: [[{dictionary for f}],[{dictionary for g}][{dictionary for h}]]
+# three items on it: [(flat dict for f, blocks for f), (... for g), (... for h)]
 class EnvironmentManager:
   def __init__(self):
-    self.environment = [[{}]]
+    self.environment = []
+    self.push()
 
   def get(self, symbol):
-    nested_envs = self.environment[-1]
-    for env in reversed(nested_envs):
-      if symbol in env:
-        return env[symbol]
+    bindings = self.flat.get(symbol)
+    if bindings:
+      return bindings[-1]
 
     return None
 
   # create a new symbol in the most nested block's environment; error if
   # the symbol already exists
   def create_new_symbol(self, symbol, create_in_top_block = False):
-    block_index = 0 if create_in_top_block else -1
-    if symbol not in self.environment[-1][block_index]:
-      self.environment[-1][block_index][symbol] = None
-      return SymbolResult.OK
+    block = self.blocks[0] if create_in_top_block else self.blocks[-1]
+    if symbol in block:
+      return SymbolResult.ERROR
 
-    return SymbolResult.ERROR
+    block.add(symbol)
+    bindings = self.flat.setdefault(symbol, [])
+    if create_in_top_block:
+      bindings.insert(0, None)   # the top block's binding is always the outermost one
+    else:
+      bindings.append(None)
+    return SymbolResult.OK
 
   # set works with symbols that were already created
   # it won't create a new symbol, only update it
   def set(self, symbol, value):
-    nested_envs = self.environment[-1]
-
-    for env in reversed(nested_envs):
-      if symbol in env:
-        env[symbol] = value
-        return SymbolResult.OK
+    bindings = self.flat.get(symbol)
+    if bindings:
+      bindings[-1] = value
+      return SymbolResult.OK
 
     return SymbolResult.ERROR
 
@@ -51,18 +56,34 @@ class EnvironmentManager:
   # and populate captured variables; use first for captured, then params
   # so params shadow captured variables
   def import_mappings(self, dict):
-    cur_env = self.environment[-1][-1]
+    block = self.blocks[-1]
     for symbol, value in dict.items():
-      cur_env[symbol] = value
+      if symbol in block:
+        self.flat[symbol][-1] = value
+      else:
+        block.add(symbol)
+        self.flat.setdefault(symbol, []).append(value)
+
+  # returns (symbol, value) for every variable visible in the current function
+  def visible_symbols(self):
+    return [(symbol, bindings[-1]) for symbol, bindings in self.flat.items()]
 
   def block_nest(self):
-    self.environment[-1].append({})   # [..., [{}]] -> [..., [{}, {}]]
+    self.blocks.append(set())
 
   def block_unnest(self):
-    self.environment[-1].pop()
+    flat = self.flat
+    for symbol in self.blocks.pop():
+      bindings = flat[symbol]
+      bindings.pop()
+      if not bindings:
+        del flat[symbol]
 
   def push(self):
-    self.environment.append([{}])       # [[...],[...]] -> [[...],[...],[]]
+    self.flat = {}
+    self.blocks = [set()]
+    self.environment.append((self.flat, self.blocks))
 
   def pop(self):
     self.environment.pop()
+    self.flat, self.blocks = self.environment[-1]
@@ -1,10 +1,14 @@
 from intbase import InterpreterBase
 
 class FuncInfo:
+  __slots__ = ('params', 'start_ip', 'captures', 'pure', 'param_specs')
+
   def __init__(self, params, start_ip, captures = []):
     self.params = params  # format is [[varname1,typename1],[varname2,typename2],...]
     self.start_ip = start_ip    # line number, zero-based
     self.captures = captures
+    self.pure = False  # set by the interpreter if calls to the function can be memoized
+    self.param_specs = None  # (name, type tag, is reference) per param, built by the interpreter on first call
 
   def __str__(self):
     return f"{self.params}::{self.start_ip}"
@@ -62,7 +66,7 @@ class FunctionManager:
     return_type_stack = [None]  # v3
 
     for line_num, line in enumerate(tokenized_program):
-      if line and line[0] == InterpreterBase.FUNC_DEF:
+      if line and line[0] is InterpreterBase.FUNC_DEF:
         # format:  func funcname self.p1:t1 p2:t2 p3:t3 ...
         func_name = line[1]
         params = [self._to_tuple(formal) for formal in line[2:-1]]
@@ -70,15 +74,15 @@ class FunctionManager:
         self.func_cache[func_name] = func_info
         return_type_stack.append(line[-1])
 
-      if line and line[0] == InterpreterBase.ENDFUNC_DEF:
+      if line and line[0] is InterpreterBase.ENDFUNC_DEF:
         reset_after_this_line = True
 
       # Include Return Types for lambdas
-      if line and line[0] == InterpreterBase.LAMBDA_DEF:
+      if line and line[0] is InterpreterBase.LAMBDA_DEF:
         # format:  lambda param1:type1 param2:type2 … return_type
         return_type_stack.append(line[-1])
 
-      if line and line[0] == InterpreterBase.ENDLAMBDA_DEF:
+      if line and line[0] is InterpreterBase.ENDLAMBDA_DEF:
         reset_after_this_line = True
       
       self.return_types.append(return_type_stack[-1])  # each line in the program is assigned a return type based on
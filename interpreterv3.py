@@ -1,12 +1,12 @@
-import copy
-from enum import Enum
+import sys
 from env_v3 import EnvironmentManager, SymbolResult
 from func_v3 import FunctionManager, FuncInfo
 from intbase import InterpreterBase, ErrorType
 from tokenize import Tokenizer
 
-# Enumerated type for our different language data types
-class Type(Enum):
+# Tags for our different language data types. These are plain small ints (not an Enum) so they're
+# cheap to compare and can index tables directly; expression temporaries are (tag, value) tuples
+class Type:
   INT = 1
   BOOL = 2
   STRING = 3
@@ -14,8 +14,16 @@ class Type(Enum):
   FUNC = 5
   OBJECT = 6
 
-# Represents a value, which has a type and its value
+# printable names of the type tags, for error messages
+TYPE_NAMES = {Type.INT: 'int', Type.BOOL: 'bool', Type.STRING: 'string', Type.VOID: 'void',
+              Type.FUNC: 'func', Type.OBJECT: 'object'}
+
+# Represents a value, which has a type and its value. Values are the mutable slots stored in
+# environments and objects (so reference parameters can share them); intermediate results of
+# expressions are plain (type, value) tuples instead
 class Value:
+  __slots__ = ('t', 'v')
+
   def __init__(self, type, value = None):
     self.t = type
     self.v = value
@@ -31,8 +39,78 @@ class Value:
     return self.t
 
   def __str__(self):
-    return f"{self.t}:{self.v}"
+    return f"{TYPE_NAMES[self.t]}:{self.v}"
+
+
+# Binary operators, numbered so an operation is found by indexing the per-type tables
+# set up in Interpreter._setup_operations rather than by looking up its name
+OP_ADD, OP_SUB, OP_MUL, OP_DIV, OP_MOD, OP_EQ, OP_NE, OP_LT, OP_LE, OP_GT, OP_GE, OP_AND, OP_OR = range(13)
+OPERATOR_NAMES = ['+','-','*','/','%','==','!=', '<', '<=', '>', '>=', '&', '|']
+
+def _int_add(a, b):
+  return (Type.INT, a[1] + b[1])
+
+def _int_sub(a, b):
+  return (Type.INT, a[1] - b[1])
+
+def _int_mul(a, b):
+  return (Type.INT, a[1] * b[1])
+
+def _int_div(a, b):
+  return (Type.INT, a[1] // b[1])  # // for integer ops
+
+def _int_mod(a, b):
+  return (Type.INT, a[1] % b[1])
+
+def _str_add(a, b):
+  return (Type.STRING, a[1] + b[1])
+
+def _bool_and(a, b):
+  return (Type.BOOL, a[1] and b[1])
+
+def _bool_or(a, b):
+  return (Type.BOOL, a[1] or b[1])
+
+# comparisons work the same way for every type that supports them
+def _eq(a, b):
+  return (Type.BOOL, a[1] == b[1])
+
+def _ne(a, b):
+  return (Type.BOOL, a[1] != b[1])
+
+def _lt(a, b):
+  return (Type.BOOL, a[1] < b[1])
 
+def _le(a, b):
+  return (Type.BOOL, a[1] <= b[1])
+
+def _gt(a, b):
+  return (Type.BOOL, a[1] > b[1])
+
+def _ge(a, b):
+  return (Type.BOOL, a[1] >= b[1])
+
+
+# Tags for the pre-resolved form of an operand token (see Interpreter._resolve_operand)
+OPERAND_LITERAL = 0   # (OPERAND_LITERAL, type, value)
+OPERAND_FIELD = 1     # (OPERAND_FIELD, object name, field name)
+OPERAND_NAME = 2      # (OPERAND_NAME, variable or function name)
+
+# Opcodes for compiled expressions; a compiled expression is a list of tuples run in order on a stack
+PUSH_LITERAL = 0      # (PUSH_LITERAL, (type, value))
+PUSH_VARIABLE = 1     # (PUSH_VARIABLE, name)
+PUSH_OPERAND = 2      # (PUSH_OPERAND, token) - anything else, resolved through _get_value
+BINARY_OP = 3         # (BINARY_OP, OP_* code)
+NOT_OP = 4            # (NOT_OP,)
+BINARY_OP_VAR_LIT = 5 # (BINARY_OP_VAR_LIT, OP_* code, name, literal) - e.g. < i 10 in one step
+
+# maximum number of memoized pure-function results kept per run; once it's reached, further calls
+# still run normally but their results aren't stored, so memory stays bounded for programs that
+# call a pure function with many distinct arguments
+MEMO_LIMIT = 10000
+
+# number of times a while loop has to jump back to its header before we try to build a trace for it
+HOT_LOOP_THRESHOLD = 8
 
 # Main interpreter class
 class Interpreter(InterpreterBase):
@@ -41,102 +119,162 @@ class Interpreter(InterpreterBase):
     self._setup_operations()  # setup all valid binary operations and the types they work on
     self._setup_default_values()  # setup the default values for each type (e.g., bool->False)
     self.trace_output = trace_output
+    self._expr_stack = []  # reused by every multi-step expression evaluation (see _run_compiled)
 
   # run a program, provided in an array of strings, one string per line of source code
   def run(self, program):
     self.program = program
     self._compute_indentation(program)  # determine indentation of every line
     self.tokenized_program = Tokenizer.tokenize_program(program)
+    self._compute_jump_targets()  # match every block opener with its closer
+    self._preresolve_tokens()  # classify every operand token once
+    self._compile_expressions()  # turn the expression on each line into a flat list of opcodes
+    self._compile_print_args()  # pre-format the literal arguments of print/input calls
     self.func_manager = FunctionManager(self.tokenized_program)
+    self._resolve_callees()  # look up statically-known function calls once
+    self._mark_pure_functions()  # find functions whose calls can be memoized
     self.ip = self.func_manager.get_function_info(InterpreterBase.MAIN_FUNC).start_ip
     self.return_stack = []
+    self.memo_keys = []   # parallel to return_stack: memo key of each active call, or None
+    self.memo = {}        # (function name, argument types/values) -> returned Value (None for void)
+    self.loop_hits = {}   # while ip -> number of times its endwhile has jumped back to it
+    self.traces = {}      # while ip -> traced loop function, or None if the loop can't be traced
     self.terminate = False
     self.env_manager = EnvironmentManager()   # used to track variables/scope
 
+    self._build_dispatch_table()  # resolve the handler for every line up front
+
     # main interpreter run loop
+    if self.trace_output:
+      while not self.terminate:
+        self._process_line()
+      return
+
+    # same as _process_line, but with the tables held in locals since this runs for every instruction
+    handlers = self.handlers
+    stmt_args = self.stmt_args
     while not self.terminate:
-      self._process_line()
+      ip = self.ip
+      handlers[ip](stmt_args[ip])
 
   def _process_line(self):
     if self.trace_output:
       print(f"{self.ip:04}: {self.program[self.ip].rstrip()}")
-    tokens = self.tokenized_program[self.ip]
-    if not tokens:
-      self._blank_line()
-      return
+    self.handlers[self.ip](self.stmt_args[self.ip])
+
+  # Build parallel lists holding the handler and the arguments for every line of the program,
+  # so each instruction is dispatched with a single call instead of re-matching its keyword
+  def _build_dispatch_table(self):
+    op_to_handler = {
+      InterpreterBase.ASSIGN_DEF: self._assign,
+      InterpreterBase.FUNCCALL_DEF: self._funccall,
+      InterpreterBase.ENDFUNC_DEF: lambda _a: self._endfunc(),
+      InterpreterBase.IF_DEF: self._if,
+      InterpreterBase.ELSE_DEF: lambda _a: self._else(),
+      InterpreterBase.ENDIF_DEF: lambda _a: self._endif(),
+      InterpreterBase.RETURN_DEF: self._return,
+      InterpreterBase.WHILE_DEF: self._while,
+      InterpreterBase.ENDWHILE_DEF: self._endwhile,
+      InterpreterBase.VAR_DEF: self._define_var,  # v2 statements
+      InterpreterBase.LAMBDA_DEF: self._lambda,
+      InterpreterBase.ENDLAMBDA_DEF: lambda _a: self._endlambda(),
+    }
+    blank_line = lambda _a: self._blank_line()
 
-    args = tokens[1:]
-
-    match tokens[0]:
-      case InterpreterBase.ASSIGN_DEF:
-        self._assign(args)
-      case InterpreterBase.FUNCCALL_DEF:
-        self._funccall(args)
-      case InterpreterBase.ENDFUNC_DEF:
-        self._endfunc()
-      case InterpreterBase.IF_DEF:
-        self._if(args)
-      case InterpreterBase.ELSE_DEF:
-        self._else()
-      case InterpreterBase.ENDIF_DEF:
-        self._endif()
-      case InterpreterBase.RETURN_DEF:
-        self._return(args)
-      case InterpreterBase.WHILE_DEF:
-        self._while(args)
-      case InterpreterBase.ENDWHILE_DEF:
-        self._endwhile(args)
-      case InterpreterBase.VAR_DEF: # v2 statements
-        self._define_var(args)
-      case InterpreterBase.LAMBDA_DEF:
-        self._lambda(args)
-      case InterpreterBase.ENDLAMBDA_DEF:
-        self._endlambda()  
-      case default:
-        raise Exception(f'Unknown command: {tokens[0]}')
+    self.handlers = []
+    self.stmt_args = []
+    for tokens in self.tokenized_program:
+      if not tokens:
+        self.handlers.append(blank_line)
+        self.stmt_args.append(())
+        continue
+      handler = op_to_handler.get(tokens[0])
+      if handler is None:
+        handler = lambda _a, command=tokens[0]: self._unknown_command(command)
+      self.handlers.append(handler)
+      self.stmt_args.append(tokens[1:])
+
+  def _unknown_command(self, command):
+    raise Exception(f'Unknown command: {command}')
 
   def _blank_line(self):
-    self._advance_to_next_statement()
+    self.ip += 1
 
   def _assign(self, tokens):
    if len(tokens) < 2:
      super().error(ErrorType.SYNTAX_ERROR,"Invalid assignment statement")
    vname = tokens[0]
-   value_type = self._eval_expression(tokens[1:])
-
-   if "." not in vname: 
-    existing_value_type = self._get_value(tokens[0]) 
+   ops = self.compiled_expr[self.ip]
+   if len(ops) == 1 and (ops[0][0] == PUSH_VARIABLE or ops[0][0] == PUSH_OPERAND):
+     # a lone variable evaluates to its own Value, so assigning it to an object field aliases the two
+     value_type = self._get_value(ops[0][1])
+   else:
+     result = self._run_compiled(ops)
+     value_type = Value(result[0], result[1])
+   self._assign_value(vname, value_type)
+   self.ip += 1
+
+  # type check and store an already evaluated value into a variable or object field
+  def _assign_value(self, vname, value_type):
+   field = self._split_field(vname)
+   if field is None:
+    existing_value_type = self._get_value(vname) 
    else: # If vname is an object variable, we can set without getting value
-    object = vname.split(".")[0]
+    object = field[0]
     if self._get_value(object).type() != Type.OBJECT:
        super().error(ErrorType.TYPE_ERROR,f"Cannot assign object variable to non-object",self.ip)
     existing_value_type = Value(Type.OBJECT, None)
 
    if existing_value_type.type() != Type.OBJECT and existing_value_type.type() != value_type.type():
-       super().error(ErrorType.TYPE_ERROR,f"Trying to assign a variable of {existing_value_type.type()} to a value of {value_type.type()}",self.ip)  
-   self._set_value(tokens[0], value_type)
-   self._advance_to_next_statement()
+       super().error(ErrorType.TYPE_ERROR,f"Trying to assign a variable of {TYPE_NAMES[existing_value_type.t]} to a value of {TYPE_NAMES[value_type.t]}",self.ip)  
+   self._set_value(vname, value_type)
 
   def _funccall(self, args):
     if not args:
       super().error(ErrorType.SYNTAX_ERROR,"Missing function name to call", self.ip)
-    if args[0] == InterpreterBase.PRINT_DEF:
+    if args[0] is InterpreterBase.PRINT_DEF:
       self._print(args[1:])
-      self._advance_to_next_statement()
-    elif args[0] == InterpreterBase.INPUT_DEF:
+      self.ip += 1
+    elif args[0] is InterpreterBase.INPUT_DEF:
       self._input(args[1:])
-      self._advance_to_next_statement()
-    elif args[0] == InterpreterBase.STRTOINT_DEF:
+      self.ip += 1
+    elif args[0] is InterpreterBase.STRTOINT_DEF:
       self._strtoint(args[1:])
-      self._advance_to_next_statement()
+      self.ip += 1
     else:
+      callee = self.resolved_callee.get(self.ip)
+      if callee is None:
+        self.return_stack.append(self.ip+1)
+        self.memo_keys.append(None)
+        self._create_new_environment(args[0], args[1:])  # Create new environment, copy args into new env
+        self.ip = self._find_first_instruction(args[0])
+        return
+
+      tmp_mappings, arg_values = self._bind_arguments(args[0], args[1:], callee[0])
+      memo_key = None
+      if callee[0].pure:
+        memo_key = (args[0], tuple((arg.t, arg.v) for arg in arg_values))
+        if memo_key in self.memo:
+          cached = self.memo[memo_key]
+          if cached is not None:
+            self._set_result(cached)
+          self.ip += 1
+          return
       self.return_stack.append(self.ip+1)
-      self._create_new_environment(args[0], args[1:])  # Create new environment, copy args into new env
-      self.ip = self._find_first_instruction(args[0])
+      self.memo_keys.append(memo_key)
+      self._push_environment(tmp_mappings)
+      self.ip = callee[1]
 
   # create a new environment for a function call
   def _create_new_environment(self, funcname, args):
-    formal_params = self.func_manager.get_function_info(funcname)   
+    tmp_mappings, _ = self._bind_arguments(funcname, args)
+    self._push_environment(tmp_mappings)
+
+  # check the arguments of a call against the function's parameters and build the mappings for
+  # the new environment; returns the mappings and the argument Values, in order
+  def _bind_arguments(self, funcname, args, formal_params = None):
+    if formal_params is None:
+      formal_params = self.func_manager.get_function_info(funcname)
     if formal_params is None:
         super().error(ErrorType.NAME_ERROR, f"Unknown function name {funcname}", self.ip)
     captures = formal_params.captures
@@ -144,34 +282,42 @@ class Interpreter(InterpreterBase):
     if len(formal_params.params) != len(args):
       super().error(ErrorType.NAME_ERROR,f"Mismatched parameter count in call to {funcname}", self.ip)
 
+    # specs are built on the first call of each function, so a bad parameter type is only
+    # reported if the function is actually called
+    param_specs = formal_params.param_specs
+    if param_specs is None:
+      param_specs = formal_params.param_specs = self._param_specs(formal_params)
     tmp_mappings = {}
-    for formal, actual in zip(formal_params.params,args):
-      formal_name = formal[0]
-      formal_typename = formal[1]
+    arg_values = []
+    for (formal_name, expected_type, is_ref), actual in zip(param_specs, args):
       arg = self._get_value(actual)
-      if arg.type() != self.compatible_types[formal_typename]:
+      arg_values.append(arg)
+      if arg.t != expected_type:
         super().error(ErrorType.TYPE_ERROR,f"Mismatched parameter type for {formal_name} in call to {funcname}", self.ip)
-      if formal_typename in self.reference_types:
+      if is_ref:
         tmp_mappings[formal_name] = arg
       else:
         if arg.type() == Type.FUNC:
             self.func_manager.create_function(formal_name, arg.value())
-        tmp_mappings[formal_name] = copy.copy(arg)
+        tmp_mappings[formal_name] = Value(arg.t, arg.v)
 
     # Make sure to include captured variable to mapping
     for value_type in captures:
         varname = value_type[0]
         value = value_type[1]
         #print(f"{varname} -- > {value}")
-        tmp_mappings[varname] = copy.deepcopy(value)
+        tmp_mappings[varname] = self._copy_value(value)
 
     # If object method, pass object into "this"
-    if "." in funcname: 
-        object = funcname.split(".")[0]
+    field = self._split_field(funcname)
+    if field is not None:
+        object = field[0]
         arg = self.env_manager.get(object)
         tmp_mappings["this"] = arg
-        
-    
+
+    return tmp_mappings, arg_values
+
+  def _push_environment(self, tmp_mappings):
     # create a new environment for the target function
     # and add our parameters to the env
     self.env_manager.push()
@@ -182,60 +328,51 @@ class Interpreter(InterpreterBase):
       self.terminate = True
     else:
       self.env_manager.pop()  # get rid of environment for the function
-      if return_val:
-        self._set_result(return_val)
-      else:
+      if not return_val:
         # return default value for type if no return value is specified. Last param of True enables
         # creation of result variable even if none exists, or is of a different type
-        return_type = self.func_manager.get_return_type_for_enclosing_function(self.ip)
-        if return_type != InterpreterBase.VOID_DEF:
-          self._set_result(self.type_to_default[return_type])
+        return_type = self.enclosing_return_type[self.ip]
+        if return_type is not InterpreterBase.VOID_DEF:
+          return_val = self.type_to_default[return_type]
+      if return_val:
+        self._set_result(return_val)
+      memo_key = self.memo_keys.pop()
+      if memo_key is not None and len(self.memo) < MEMO_LIMIT:
+        self.memo[memo_key] = return_val
       self.ip = self.return_stack.pop()
 
   def _if(self, args):
     if not args:
       super().error(ErrorType.SYNTAX_ERROR,"Invalid if syntax", self.ip)
-    value_type = self._eval_expression(args)
-    if value_type.type() != Type.BOOL:
+    result = self._run_compiled(self.compiled_expr[self.ip])
+    if result[0] != Type.BOOL:
       super().error(ErrorType.TYPE_ERROR,"Non-boolean if expression", self.ip)
-    if value_type.value():
-      self._advance_to_next_statement()
+    if result[1]:
+      self.ip += 1
       self.env_manager.block_nest()  # we're in a nested block, so create new env for it
       return
     else:
-      for line_num in range(self.ip+1, len(self.tokenized_program)):
-        tokens = self.tokenized_program[line_num]
-        if not tokens:
-          continue
-        if tokens[0] == InterpreterBase.ENDIF_DEF and self.indents[self.ip] == self.indents[line_num]:
-          self.ip = line_num + 1
-          return
-        if tokens[0] == InterpreterBase.ELSE_DEF and self.indents[self.ip] == self.indents[line_num]:
-          self.ip = line_num + 1
-          self.env_manager.block_nest()  # we're in a nested else block, so create new env for it
-          return
-    super().error(ErrorType.SYNTAX_ERROR,"Missing endif", self.ip)
+      if self.ip not in self.if_false_target:
+        super().error(ErrorType.SYNTAX_ERROR,"Missing endif", self.ip)
+      self.ip, enters_else = self.if_false_target[self.ip]
+      if enters_else:
+        self.env_manager.block_nest()  # we're in a nested else block, so create new env for it
 
   def _endif(self):
-    self._advance_to_next_statement()
+    self.ip += 1
     self.env_manager.block_unnest()
 
   # we would only run this if we ran the successful if block, and fell into the else at the end of the block
   # so we need to delete the old top environment
   def _else(self):
     self.env_manager.block_unnest()   # Get rid of env for block above
-    for line_num in range(self.ip+1, len(self.tokenized_program)):
-      tokens = self.tokenized_program[line_num]
-      if not tokens:
-        continue
-      if tokens[0] == InterpreterBase.ENDIF_DEF and self.indents[self.ip] == self.indents[line_num]:
-          self.ip = line_num + 1
-          return
-    super().error(ErrorType.SYNTAX_ERROR,"Missing endif", self.ip)
+    if self.ip not in self.endif_target:
+      super().error(ErrorType.SYNTAX_ERROR,"Missing endif", self.ip)
+    self.ip = self.endif_target[self.ip]
 
   def _return(self,args):
     # do we want to support returns without values?
-    return_type = self.func_manager.get_return_type_for_enclosing_function(self.ip)
+    return_type = self.enclosing_return_type[self.ip]
     default_value_type = self.type_to_default[return_type]
     if default_value_type.type() == Type.VOID:
       if args:
@@ -247,78 +384,122 @@ class Interpreter(InterpreterBase):
       return
 
     #otherwise evaluate the expression and return its value
-    value_type = self._eval_expression(args)
-    if value_type.type() != default_value_type.type():
+    result = self._run_compiled(self.compiled_expr[self.ip])
+    if result[0] != default_value_type.type():
       super().error(ErrorType.TYPE_ERROR,"Non-matching return type", self.ip)
-    self._lambda_or_func(value_type)
+    self._lambda_or_func(Value(result[0], result[1]))
 
   def _while(self, args):
     if not args:
       super().error(ErrorType.SYNTAX_ERROR,"Missing while expression", self.ip)
-    value_type = self._eval_expression(args)
-    if value_type.type() != Type.BOOL:
+    trace = self.traces.get(self.ip)
+    if trace is not None:
+      trace()  # runs the rest of the loop and leaves ip after the endwhile
+      return
+    result = self._run_compiled(self.compiled_expr[self.ip])
+    if result[0] != Type.BOOL:
       super().error(ErrorType.TYPE_ERROR,"Non-boolean while expression", self.ip)
-    if value_type.value() == False:
+    if result[1] == False:
       self._exit_while()
       return
 
     # If true, we advance to the next statement
-    self._advance_to_next_statement()
+    self.ip += 1
     # And create a new scope
     self.env_manager.block_nest()
 
   def _exit_while(self):
-    while_indent = self.indents[self.ip]
-    cur_line = self.ip + 1
-    while cur_line < len(self.tokenized_program):
-      if self.tokenized_program[cur_line][0] == InterpreterBase.ENDWHILE_DEF and self.indents[cur_line] == while_indent:
-        self.ip = cur_line + 1
-        return
-      if self.tokenized_program[cur_line] and self.indents[cur_line] < self.indents[self.ip]:
-        break # syntax error!
-      cur_line += 1
-    # didn't find endwhile
-    super().error(ErrorType.SYNTAX_ERROR,"Missing endwhile", self.ip)
+    if self.ip not in self.while_end:
+      super().error(ErrorType.SYNTAX_ERROR,"Missing endwhile", self.ip)
+    self.ip = self.while_end[self.ip]
 
   def _endwhile(self, args):
     # first delete the scope
     self.env_manager.block_unnest()
-    while_indent = self.indents[self.ip]
-    cur_line = self.ip - 1
-    while cur_line >= 0:
-      if self.tokenized_program[cur_line][0] == InterpreterBase.WHILE_DEF and self.indents[cur_line] == while_indent:
-        self.ip = cur_line
-        return
-      if self.tokenized_program[cur_line] and self.indents[cur_line] < self.indents[self.ip]:
-        break # syntax error!
-      cur_line -= 1
-    # didn't find while
-    super().error(ErrorType.SYNTAX_ERROR,"Missing while", self.ip)
+    if self.ip not in self.while_start:
+      super().error(ErrorType.SYNTAX_ERROR,"Missing while", self.ip)
+    self.ip = self.while_start[self.ip]
+
+    # line-by-line trace output needs every line to go through the dispatcher; once a loop has been
+    # looked at (traced or found untraceable) there is nothing left to count
+    if not self.trace_output and self.ip not in self.traces:
+      hits = self.loop_hits.get(self.ip, 0) + 1
+      self.loop_hits[self.ip] = hits
+      if hits == HOT_LOOP_THRESHOLD:
+        self.traces[self.ip] = self._build_trace(self.ip)
+
+  # Build a function that runs a hot while loop (from its condition check until it exits) without
+  # going back through the dispatch loop for every line. Only loops whose bodies are straight-line
+  # code can be traced: assignments, variable definitions, and calls to built-in functions.
+  # Anything that can jump (if, nested while, calls to user functions, return) makes us return None,
+  # and the loop keeps running through the normal dispatcher.
+  def _build_trace(self, while_ip):
+    straight_line_calls = {InterpreterBase.PRINT_DEF, InterpreterBase.INPUT_DEF, InterpreterBase.STRTOINT_DEF}
+    endwhile_ip = self.while_end[while_ip] - 1
+    body = []
+    for line_num in range(while_ip + 1, endwhile_ip):
+      tokens = self.tokenized_program[line_num]
+      if not tokens:
+        continue
+      if not (tokens[0] is InterpreterBase.ASSIGN_DEF or tokens[0] is InterpreterBase.VAR_DEF or
+              (tokens[0] is InterpreterBase.FUNCCALL_DEF and len(tokens) > 1 and tokens[1] in straight_line_calls)):
+        return None
+      # assignments to plain variables get an inlined fast path (see traced_loop)
+      target = None
+      if tokens[0] is InterpreterBase.ASSIGN_DEF and len(tokens) > 2 and self._split_field(tokens[1]) is None:
+        target = tokens[1]
+      body.append((line_num, self.handlers[line_num], self.stmt_args[line_num], target, self.compiled_expr[line_num]))
+
+    cond_ops = self.compiled_expr[while_ip]
+    exit_ip = endwhile_ip + 1
+    run_compiled = self._run_compiled
+    env_manager = self.env_manager
+    env_get = env_manager.get
+
+    def traced_loop():
+      while True:
+        self.ip = while_ip
+        result = run_compiled(cond_ops)
+        if result[0] != Type.BOOL:
+          self.error(ErrorType.TYPE_ERROR,"Non-boolean while expression", self.ip)
+        if result[1] == False:
+          self.ip = exit_ip
+          return
+        env_manager.block_nest()
+        for line_num, handler, args, target, ops in body:
+          self.ip = line_num   # handlers report errors against (and step from) the current ip
+          if target is not None:
+            # the common case of _assign: an existing variable getting a same-typed, non-func value
+            result = run_compiled(ops)
+            existing = env_get(target)
+            if existing is not None and existing.t == result[0] and result[0] != Type.FUNC:
+              existing.v = result[1]
+            else:
+              # otherwise finish the assignment with the value we already have rather than
+              # letting _assign evaluate the expression again
+              self._assign_value(target, Value(result[0], result[1]))
+            continue
+          handler(args)
+        env_manager.block_unnest()
+
+    return traced_loop
 
   # This function determines if a return statement is bound to a function or lambda
   # then calls endfunc or endlamba
   def _lambda_or_func(self, return_val = None):
-    cur_line = self.ip + 1
-    length = len(self.tokenized_program)
-    while cur_line < length:
-        if self.tokenized_program[cur_line][0] == InterpreterBase.ENDFUNC_DEF:
-            self._endfunc(return_val)
-            return
-        if self.tokenized_program[cur_line][0] == InterpreterBase.ENDLAMBDA_DEF:
-            self._endlambda(return_val)
-            return
-        cur_line += 1
-    assert(False)        
+    end_token = self.return_end.get(self.ip)
+    if end_token is InterpreterBase.ENDFUNC_DEF:
+      self._endfunc(return_val)
+    elif end_token is InterpreterBase.ENDLAMBDA_DEF:
+      self._endlambda(return_val)
+    else:
+      super().error(ErrorType.SYNTAX_ERROR,"Return outside of function", self.ip)
   
   def _lambda(self, args):
     # format:  lambda param1:type1 param2:type2 … return_type
-    nested_envs = self.env_manager.environment[-1]
-    captures = []
-    for environment in nested_envs:
-        if environment.items():
-            captures += [(k, v) for k, v in environment.items()]
-    
-    #print(f"{captures[0][0]};{captures[0][1]}")
+    # capture references to the current Values; they're copied when the lambda is called
+    captures = self.env_manager.visible_symbols()
+
     self.func_manager.set_lambda(args, self.ip, captures) # Sets resultf in function manager to current lambda
     func_info = self.func_manager.get_function_info("resultf")
     value_type = Value(Type.FUNC, func_info)
@@ -332,23 +513,16 @@ class Interpreter(InterpreterBase):
     else:
         # return default value for type if no return value is specified. Last param of True enables
         # creation of result variable even if none exists, or is of a different type
-        return_type = self.func_manager.get_return_type_for_enclosing_function(self.ip)
-        if return_type != InterpreterBase.VOID_DEF:
+        return_type = self.enclosing_return_type[self.ip]
+        if return_type is not InterpreterBase.VOID_DEF:
           self._set_result(self.type_to_default[return_type])    
+    self.memo_keys.pop()  # lambdas are never memoized
     self.ip = self.return_stack.pop()
 
   def _exit_lambda(self):
-    lambda_indent = self.indents[self.ip]
-    cur_line = self.ip + 1
-    while cur_line < len(self.tokenized_program):
-      if self.tokenized_program[cur_line][0] == InterpreterBase.ENDLAMBDA_DEF and self.indents[cur_line] == lambda_indent:
-        self.ip = cur_line + 1
-        return
-      if self.tokenized_program[cur_line] and self.indents[cur_line] < self.indents[self.ip]:
-        break # syntax error!
-      cur_line += 1
-    # didn't find endlambda
-    super().error(ErrorType.SYNTAX_ERROR,"Missing endlambda", self.ip)
+    if self.ip not in self.lambda_end:
+      super().error(ErrorType.SYNTAX_ERROR,"Missing endlambda", self.ip)
+    self.ip = self.lambda_end[self.ip]
   
   def _define_var(self, args):
     if len(args) < 2:
@@ -360,18 +534,15 @@ class Interpreter(InterpreterBase):
       if args[0] not in self.type_to_default:
         super().error(ErrorType.TYPE_ERROR,f"Invalid type {args[0]}", self.ip)
       # Create the variable with a copy of the default value for the type
-      self.env_manager.set(var_name, copy.deepcopy(self.type_to_default[args[0]]))
+      self.env_manager.set(var_name, self._copy_value(self.type_to_default[args[0]]))
 
     #print(self.env_manager.environment)
-    self._advance_to_next_statement()
+    self.ip += 1
 
   def _print(self, args):
     if not args:
       super().error(ErrorType.SYNTAX_ERROR,"Invalid print call syntax", self.ip)
-    out = []
-    for arg in args:
-      val_type = self._get_value(arg)
-      out.append(str(val_type.value()))
+    out = [text if text is not None else str(self._get_value(arg).v) for text, arg in self.print_desc[self.ip]]
     super().output(''.join(out))
 
   def _input(self, args):
@@ -388,10 +559,6 @@ class Interpreter(InterpreterBase):
       super().error(ErrorType.TYPE_ERROR,"Non-string passed to strtoint", self.ip)
     self._set_result(Value(Type.INT, int(value_type.value())))   # return always passed back in result
 
-  def _advance_to_next_statement(self):
-    # for now just increment IP, but later deal with loops, returns, end of functions, etc.
-    self.ip += 1
-
   # Set up type-related data structures
   def _setup_default_values(self):
     # set up what value to return as the default value for each type
@@ -427,40 +594,180 @@ class Interpreter(InterpreterBase):
 
   # run a program, provided in an array of strings, one string per line of source code
   def _setup_operations(self):
-    self.binary_op_list = ['+','-','*','/','%','==','!=', '<', '<=', '>', '>=', '&', '|']
-    self.binary_ops = {}
-    self.binary_ops[Type.INT] = {
-     '+': lambda a,b: Value(Type.INT, a.value()+b.value()),
-     '-': lambda a,b: Value(Type.INT, a.value()-b.value()),
-     '*': lambda a,b: Value(Type.INT, a.value()*b.value()),
-     '/': lambda a,b: Value(Type.INT, a.value()//b.value()),  # // for integer ops
-     '%': lambda a,b: Value(Type.INT, a.value()%b.value()),
-     '==': lambda a,b: Value(Type.BOOL, a.value()==b.value()),
-     '!=': lambda a,b: Value(Type.BOOL, a.value()!=b.value()),
-     '>': lambda a,b: Value(Type.BOOL, a.value()>b.value()),
-     '<': lambda a,b: Value(Type.BOOL, a.value()<b.value()),
-     '>=': lambda a,b: Value(Type.BOOL, a.value()>=b.value()),
-     '<=': lambda a,b: Value(Type.BOOL, a.value()<=b.value()),
-    }
-    self.binary_ops[Type.STRING] = {
-     '+': lambda a,b: Value(Type.STRING, a.value()+b.value()),
-     '==': lambda a,b: Value(Type.BOOL, a.value()==b.value()),
-     '!=': lambda a,b: Value(Type.BOOL, a.value()!=b.value()),
-     '>': lambda a,b: Value(Type.BOOL, a.value()>b.value()),
-     '<': lambda a,b: Value(Type.BOOL, a.value()<b.value()),
-     '>=': lambda a,b: Value(Type.BOOL, a.value()>=b.value()),
-     '<=': lambda a,b: Value(Type.BOOL, a.value()<=b.value()),
-    }
-    self.binary_ops[Type.BOOL] = {
-     '&': lambda a,b: Value(Type.BOOL, a.value() and b.value()),
-     '==': lambda a,b: Value(Type.BOOL, a.value()==b.value()),
-     '!=': lambda a,b: Value(Type.BOOL, a.value()!=b.value()),
-     '|': lambda a,b: Value(Type.BOOL, a.value() or b.value())
-    }
-  
+    self.binary_op_codes = {name: code for code, name in enumerate(OPERATOR_NAMES)}
+    int_ops = [None] * len(OPERATOR_NAMES)
+    int_ops[OP_ADD] = _int_add
+    int_ops[OP_SUB] = _int_sub
+    int_ops[OP_MUL] = _int_mul
+    int_ops[OP_DIV] = _int_div
+    int_ops[OP_MOD] = _int_mod
+    string_ops = [None] * len(OPERATOR_NAMES)
+    string_ops[OP_ADD] = _str_add
+    bool_ops = [None] * len(OPERATOR_NAMES)
+    bool_ops[OP_AND] = _bool_and
+    bool_ops[OP_OR] = _bool_or
+    for code, operation in ((OP_EQ, _eq), (OP_NE, _ne)):
+      int_ops[code] = string_ops[code] = bool_ops[code] = operation
+    for code, operation in ((OP_LT, _lt), (OP_LE, _le), (OP_GT, _gt), (OP_GE, _ge)):
+      int_ops[code] = string_ops[code] = operation
+
+    no_ops = [None] * len(OPERATOR_NAMES)
+    self.binary_ops = [no_ops] * (Type.OBJECT + 1)  # indexed by type tag
+    self.binary_ops[Type.INT] = int_ops
+    self.binary_ops[Type.STRING] = string_ops
+    self.binary_ops[Type.BOOL] = bool_ops
+
   def _compute_indentation(self, program):
     self.indents = [len(line) - len(line.lstrip(' ')) for line in program]
 
+  # Match every if/else/while/lambda with its closing statement (and every return with the
+  # end of its enclosing function or lambda) in a single pass, using a stack of open blocks.
+  # Branches then jump straight to the recorded target instead of scanning for it.
+  def _compute_jump_targets(self):
+    self.if_false_target = {}  # if ip -> (ip to continue at, whether it enters an else block)
+    self.endif_target = {}     # else ip -> ip after the matching endif
+    self.while_end = {}        # while ip -> ip after the matching endwhile
+    self.while_start = {}      # endwhile ip -> ip of the matching while
+    self.lambda_end = {}       # lambda ip -> ip after the matching endlambda
+    self.return_end = {}       # return ip -> endfunc/endlambda token of the enclosing function
+    self.func_end = {}         # func ip -> ip of the matching endfunc
+
+    closers = {
+      InterpreterBase.ELSE_DEF: (InterpreterBase.IF_DEF,),
+      InterpreterBase.ENDIF_DEF: (InterpreterBase.IF_DEF, InterpreterBase.ELSE_DEF),
+      InterpreterBase.ENDWHILE_DEF: (InterpreterBase.WHILE_DEF,),
+      InterpreterBase.ENDLAMBDA_DEF: (InterpreterBase.LAMBDA_DEF,),
+      InterpreterBase.ENDFUNC_DEF: (InterpreterBase.FUNC_DEF,),
+    }
+    openers = {InterpreterBase.IF_DEF, InterpreterBase.WHILE_DEF,
+               InterpreterBase.LAMBDA_DEF, InterpreterBase.FUNC_DEF}
+    stack = []  # entries are [opening token, indent, ip, returns inside the block]
+
+    for line_num, tokens in enumerate(self.tokenized_program):
+      if not tokens:
+        continue
+      op = tokens[0]
+      indent = self.indents[line_num]
+      if op in openers:
+        stack.append([op, indent, line_num, []])
+        continue
+      if op is InterpreterBase.RETURN_DEF:
+        for block in reversed(stack):
+          if block[0] is InterpreterBase.FUNC_DEF or block[0] is InterpreterBase.LAMBDA_DEF:
+            block[3].append(line_num)
+            break
+        continue
+      if op not in closers:
+        continue
+
+      # find the innermost open block this closer belongs to; anything still open above it is unterminated
+      for depth in range(len(stack) - 1, -1, -1):
+        if stack[depth][0] in closers[op] and stack[depth][1] == indent:
+          break
+      else:
+        continue
+      block = stack[depth]
+      del stack[depth:]
+
+      if op is InterpreterBase.ELSE_DEF:
+        self.if_false_target[block[2]] = (line_num + 1, True)
+        stack.append([op, indent, line_num, []])
+      elif op is InterpreterBase.ENDIF_DEF:
+        if block[0] is InterpreterBase.ELSE_DEF:
+          self.endif_target[block[2]] = line_num + 1
+        else:
+          self.if_false_target[block[2]] = (line_num + 1, False)
+      elif op is InterpreterBase.ENDWHILE_DEF:
+        self.while_end[block[2]] = line_num + 1
+        self.while_start[line_num] = block[2]
+      else:
+        if op is InterpreterBase.ENDLAMBDA_DEF:
+          self.lambda_end[block[2]] = line_num + 1
+        else:
+          self.func_end[block[2]] = line_num
+        for return_ip in block[3]:
+          self.return_end[return_ip] = op
+
+  # For every funccall to a function defined with "func" whose name can never be rebound to another
+  # function at runtime (i.e., it's never assigned to and isn't a func parameter), record its FuncInfo
+  # and start IP so the call doesn't have to look it up again. Also keep the enclosing return type
+  # of every line at hand.
+  def _resolve_callees(self):
+    self.enclosing_return_type = self.func_manager.return_types
+    self.resolved_callee = {}
+
+    rebindable = {InterpreterBase.RESULT_DEF + self.type_to_result[Type.FUNC]}
+    for tokens in self.tokenized_program:
+      if not tokens:
+        continue
+      if tokens[0] is InterpreterBase.ASSIGN_DEF and len(tokens) > 1:
+        rebindable.add(tokens[1])
+      elif tokens[0] is InterpreterBase.FUNC_DEF or tokens[0] is InterpreterBase.LAMBDA_DEF:
+        for formal in tokens[1:-1]:
+          name, _, typename = formal.partition(':')
+          if typename == InterpreterBase.FUNC_DEF:
+            rebindable.add(name)
+
+    defined = {tokens[1] for tokens in self.tokenized_program
+               if len(tokens) > 1 and tokens[0] is InterpreterBase.FUNC_DEF}
+    for line_num, tokens in enumerate(self.tokenized_program):
+      if len(tokens) < 2 or tokens[0] is not InterpreterBase.FUNCCALL_DEF:
+        continue
+      funcname = tokens[1]
+      if funcname in defined and funcname not in rebindable:
+        func_info = self.func_manager.get_function_info(funcname)
+        self.resolved_callee[line_num] = (func_info, func_info.start_ip)
+
+  # returns (name, expected type tag, passed by reference) for each formal parameter of a function
+  def _param_specs(self, func_info):
+    return [(name, self.compatible_types[typename], typename in self.reference_types)
+            for name, typename in func_info.params]
+
+  # Mark functions whose result depends only on their arguments, so calls to them can be memoized.
+  # A function is pure if it only takes and returns ints, strings and bools, never touches objects,
+  # function values or lambdas, does no I/O, and only calls other pure functions (or strtoint).
+  # Purity of calls is propagated until nothing changes.
+  def _mark_pure_functions(self):
+    value_types = {InterpreterBase.INT_DEF, InterpreterBase.STRING_DEF, InterpreterBase.BOOL_DEF}
+    pure_calls = {InterpreterBase.STRTOINT_DEF}
+    candidates = {}   # function name -> names of the user functions it calls
+    for func_ip, end_ip in self.func_end.items():
+      header = self.tokenized_program[func_ip]
+      func_info = self.func_manager.get_function_info(header[1])
+      if func_info is None or func_info.start_ip != func_ip + 1:
+        continue
+      if any(typename not in value_types for _, typename in func_info.params):
+        continue
+      if header[-1] not in value_types and header[-1] is not InterpreterBase.VOID_DEF:
+        continue
+
+      callees = set()
+      for line_num in range(func_ip + 1, end_ip):
+        tokens = self.tokenized_program[line_num]
+        if not tokens:
+          continue
+        if tokens[0] is InterpreterBase.LAMBDA_DEF or any(self._split_field(token) for token in tokens):
+          break
+        if tokens[0] is InterpreterBase.VAR_DEF and (len(tokens) < 2 or tokens[1] not in value_types):
+          break
+        if tokens[0] is InterpreterBase.FUNCCALL_DEF and len(tokens) > 1 and tokens[1] not in pure_calls:
+          if line_num not in self.resolved_callee:
+            break   # print/input, or a call through a function variable
+          callees.add(tokens[1])
+      else:
+        candidates[header[1]] = callees
+
+    changed = True
+    while changed:
+      changed = False
+      for name, callees in list(candidates.items()):
+        if any(callee not in candidates for callee in callees):
+          del candidates[name]
+          changed = True
+
+    for name in candidates:
+      self.func_manager.get_function_info(name).pure = True
+
   def _find_first_instruction(self, funcname):
     func_info = self.func_manager.get_function_info(funcname)
     if not func_info:
@@ -470,85 +777,234 @@ class Interpreter(InterpreterBase):
 
     return func_info.start_ip
 
-  # given a token name (e.g., x, 17, True, "foo"), give us a Value object associated with it
-  def _get_value(self, token):
-    if not token:
-      super().error(ErrorType.NAME_ERROR,f"Empty token", self.ip)
+  # classify every token in the program once, so evaluating an operand doesn't have to
+  # re-parse its text each time the line runs
+  def _preresolve_tokens(self):
+    self.operands = {}
+    for tokens in self.tokenized_program:
+      for token in tokens:
+        if token not in self.operands:
+          try:
+            self.operands[token] = self._resolve_operand(token)
+          except ValueError:
+            pass  # malformed literal (or the - operator); reported if it's ever evaluated
+
+  # given a token, return a descriptor tuple saying how to get its value (see OPERAND_* tags)
+  def _resolve_operand(self, token):
     if token[0] == '"':
-      return Value(Type.STRING, token.strip('"'))
+      return (OPERAND_LITERAL, Type.STRING, token.strip('"'))
     if token.isdigit() or token[0] == '-':
-      return Value(Type.INT, int(token))
+      return (OPERAND_LITERAL, Type.INT, int(token))
     if token == InterpreterBase.TRUE_DEF or token == Interpreter.FALSE_DEF:
-      return Value(Type.BOOL, token == InterpreterBase.TRUE_DEF)
+      return (OPERAND_LITERAL, Type.BOOL, token == InterpreterBase.TRUE_DEF)
     if "." in token:
-      object = token.split(".")[0]
-      variable = token.split(".")[1]
-      object_dict = self.env_manager.get(object).value()
+      object, variable = token.split(".")[:2]
+      return (OPERAND_FIELD, sys.intern(object), sys.intern(variable))
+    return (OPERAND_NAME, token)
+
+  # for an object field token (e.g., o.x) return its pre-split (object, field) names, otherwise None
+  def _split_field(self, token):
+    operand = self.operands.get(token)
+    if operand is not None and operand[0] == OPERAND_FIELD:
+      return operand[1:]
+    return None
+
+  # given a token name (e.g., x, 17, True, "foo"), give us a Value object associated with it
+  def _get_value(self, token):
+    operand = self.operands.get(token)
+    if operand is None:
+      if not token:
+        super().error(ErrorType.NAME_ERROR,f"Empty token", self.ip)
+      operand = self.operands[token] = self._resolve_operand(token)
+
+    tag = operand[0]
+    if tag == OPERAND_LITERAL:
+      return Value(operand[1], operand[2])
+    if tag == OPERAND_FIELD:
+      object_dict = self.env_manager.get(operand[1]).value()
       if object_dict is None:
         super().error(ErrorType.TYPE_ERROR,f"Variable not of type Object: {token}", self.ip)
-      if variable in object_dict:
-        #print(object_dict[variable])
-        return object_dict[variable]
+      if operand[2] in object_dict:
+        return object_dict[operand[2]]
       super().error(ErrorType.NAME_ERROR,f"Object variable does not exist: {token}", self.ip)
-    
+
     # look in environments for variable
     val = self.env_manager.get(token)
     if val != None:
       return val
     # look in function manager for function name
-    if self.func_manager.get_function_info(token):
-      return Value(Type.FUNC, self.func_manager.get_function_info(token))
+    func_info = self.func_manager.get_function_info(token)
+    if func_info:
+      return Value(Type.FUNC, func_info)
     # not found
     super().error(ErrorType.NAME_ERROR,f"Unknown variable {token}", self.ip)
 
   # given a variable name and a Value object, associate the name with the value
   def _set_value(self, varname, to_value_type):
-    value_type = self.env_manager.get(varname)
     if to_value_type.type() == Type.FUNC:
       self.func_manager.create_function(varname, to_value_type.value())
-    if "." in varname:
-      object = varname.split(".")[0]
-      variable = varname.split(".")[1]
-      value_type = self.env_manager.get(object)
-      object_dict = self.env_manager.get(object).value()
-      object_dict[variable] = to_value_type
+    field = self._split_field(varname)
+    if field is None:
+      value_type = self.env_manager.get(varname)
+    else:
+      value_type = self.env_manager.get(field[0])
+      object_dict = value_type.value()
+      object_dict[field[1]] = to_value_type
       to_value_type = Value(Type.OBJECT, object_dict)
     if value_type == None:
       super().error(ErrorType.NAME_ERROR,f"Assignment of unknown variable {varname}", self.ip)
     value_type.set(to_value_type)
 
+  # deep copy a Value without copy.deepcopy: objects get their own field dictionary with every field
+  # Value copied (recursing into object fields), while function info is never modified after it's
+  # created so it can be shared. Like deepcopy, copies maps the id of each original Value and field
+  # dictionary to its copy, so shared and cyclic references are preserved in the copy.
+  def _copy_value(self, value_type, copies = None):
+    if value_type is None:
+      return None   # a captured binding whose block has already ended
+    if copies is None:
+      if value_type.t != Type.OBJECT or value_type.v is None:
+        return Value(value_type.t, value_type.v)
+      copies = {}
+    copied = copies.get(id(value_type))
+    if copied is not None:
+      return copied
+    copied = copies[id(value_type)] = Value(value_type.t, value_type.v)
+    if value_type.t != Type.OBJECT or value_type.v is None:
+      return copied
+
+    object_dict = value_type.v
+    copied_dict = copies.get(id(object_dict))
+    if copied_dict is None:
+      copied_dict = copies[id(object_dict)] = {}
+      for field, field_value in object_dict.items():
+        copied_dict[field] = self._copy_value(field_value, copies)
+    copied.v = copied_dict
+    return copied
+
   # bind the result[s,i,b] variable in the calling function's scope to the proper Value object
   def _set_result(self, value_type):
     # always stores result in the highest-level block scope for a function, so nested if/while blocks
     # don't each have their own version of result
     result_var = InterpreterBase.RESULT_DEF + self.type_to_result[value_type.type()]
     self.env_manager.create_new_symbol(result_var, True)  # create in top block if it doesn't exist
-    self.env_manager.set(result_var, copy.copy(value_type))
+    self.env_manager.set(result_var, Value(value_type.t, value_type.v))
   
-  # evaluate expressions in prefix notation: + 5 * 6 x
-  def _eval_expression(self, tokens):
-    stack = []
-
+  # compile the expression on every assign/if/while/return line; lines without one get None
+  def _compile_expressions(self):
+    expression_start = {InterpreterBase.ASSIGN_DEF: 2, InterpreterBase.IF_DEF: 1,
+                        InterpreterBase.WHILE_DEF: 1, InterpreterBase.RETURN_DEF: 1}
+    self.compiled_expr = []
+    for tokens in self.tokenized_program:
+      start = expression_start.get(tokens[0]) if tokens else None
+      self.compiled_expr.append(None if start is None else self._compile_expression(tokens[start:]))
+
+  # for every print/input call, record each argument as (text, None) if it's a literal whose printed
+  # form is known up front, or (None, token) if it has to be looked up when the line runs
+  def _compile_print_args(self):
+    self.print_desc = {}
+    for line_num, tokens in enumerate(self.tokenized_program):
+      if len(tokens) < 2 or tokens[0] is not InterpreterBase.FUNCCALL_DEF:
+        continue
+      if tokens[1] is not InterpreterBase.PRINT_DEF and tokens[1] is not InterpreterBase.INPUT_DEF:
+        continue
+      desc = []
+      for token in tokens[2:]:
+        operand = self.operands.get(token)
+        if operand is not None and operand[0] == OPERAND_LITERAL:
+          desc.append((str(operand[2]), None))
+        else:
+          desc.append((None, token))
+      self.print_desc[line_num] = desc
+
+  # compile an expression in prefix notation (+ 5 * 6 x) into opcodes; walking the tokens
+  # in reverse gives the order a stack machine has to execute them in
+  def _compile_expression(self, tokens):
+    ops = []
     for token in reversed(tokens):
-      if token in self.binary_op_list:
-        v1 = stack.pop()
-        v2 = stack.pop()
-        if v1.type() != v2.type():
-          super().error(ErrorType.TYPE_ERROR,f"Mismatching types {v1.type()} and {v2.type()}", self.ip)
-        operations = self.binary_ops[v1.type()]
-        if token not in operations:
-          super().error(ErrorType.TYPE_ERROR,f"Operator {token} is not compatible with {v1.type()}", self.ip)
-        stack.append(operations[token](v1,v2))
+      code = self.binary_op_codes.get(token)
+      if code is not None:
+        # fuse "push literal, push variable, operator" (i.e., op var literal) into a single step
+        if len(ops) >= 2 and ops[-1][0] == PUSH_VARIABLE and ops[-2][0] == PUSH_LITERAL:
+          name = ops.pop()[1]
+          literal = ops.pop()[1]
+          ops.append((BINARY_OP_VAR_LIT, code, name, literal))
+        else:
+          ops.append((BINARY_OP, code))
       elif token == '!':
-        v1 = stack.pop()
-        if v1.type() != Type.BOOL:
-          super().error(ErrorType.TYPE_ERROR,f"Expecting boolean for ! {v1.type()}", self.ip)
-        stack.append(Value(Type.BOOL, not v1.value()))
+        ops.append((NOT_OP,))
+      else:
+        operand = self.operands.get(token)
+        if operand is not None and operand[0] == OPERAND_LITERAL:
+          ops.append((PUSH_LITERAL, (operand[1], operand[2])))  # immutable, so shared by every run
+        elif operand is not None and operand[0] == OPERAND_NAME:
+          ops.append((PUSH_VARIABLE, token))
+        else:
+          ops.append((PUSH_OPERAND, token))
+    return ops
+
+  # evaluate a compiled expression (see _compile_expression); returns a (type, value) tuple
+  def _run_compiled(self, ops):
+    # most expressions are a single operand or a single fused operation, which need no stack
+    if len(ops) == 1:
+      op = ops[0]
+      code = op[0]
+      if code == PUSH_LITERAL:
+        return op[1]
+      if code == PUSH_VARIABLE:
+        value_type = self.env_manager.get(op[1])
+        if value_type is None:
+          value_type = self._get_value(op[1])
+        return (value_type.t, value_type.v)
+      if code == BINARY_OP_VAR_LIT:
+        value_type = self.env_manager.get(op[2])
+        if value_type is None:
+          value_type = self._get_value(op[2])
+        return self._binary_op(op[1], (value_type.t, value_type.v), op[3])
+
+    # expression evaluation never nests, so one stack can be cleared and reused for every evaluation
+    stack = self._expr_stack
+    del stack[:]
+    push = stack.append
+    pop = stack.pop
+    env_get = self.env_manager.get
+
+    for op in ops:
+      code = op[0]
+      if code == PUSH_VARIABLE:
+        value_type = env_get(op[1])
+        if value_type is None:
+          value_type = self._get_value(op[1])
+        push((value_type.t, value_type.v))
+      elif code == PUSH_LITERAL:
+        push(op[1])
+      elif code == BINARY_OP_VAR_LIT:
+        value_type = env_get(op[2])
+        if value_type is None:
+          value_type = self._get_value(op[2])
+        push(self._binary_op(op[1], (value_type.t, value_type.v), op[3]))
+      elif code == BINARY_OP:
+        v1 = pop()
+        v2 = pop()
+        push(self._binary_op(op[1], v1, v2))
+      elif code == NOT_OP:
+        v1 = pop()
+        if v1[0] != Type.BOOL:
+          super().error(ErrorType.TYPE_ERROR,f"Expecting boolean for ! {TYPE_NAMES[v1[0]]}", self.ip)
+        push((Type.BOOL, not v1[1]))
       else:
-        value_type = self._get_value(token)
-        stack.append(value_type)
+        value_type = self._get_value(op[1])
+        push((value_type.t, value_type.v))
 
     if len(stack) != 1:
       super().error(ErrorType.SYNTAX_ERROR,f"Invalid expression", self.ip)
 
     return stack[0]
+
+  def _binary_op(self, code, v1, v2):
+    if v1[0] != v2[0]:
+      super().error(ErrorType.TYPE_ERROR,f"Mismatching types {TYPE_NAMES[v1[0]]} and {TYPE_NAMES[v2[0]]}", self.ip)
+    operation = self.binary_ops[v1[0]][code]
+    if operation is None:
+      super().error(ErrorType.TYPE_ERROR,f"Operator {OPERATOR_NAMES[code]} is not compatible with {TYPE_NAMES[v1[0]]}", self.ip)
+    return operation(v1, v2)
@@ -1,15 +1,31 @@
+import sys
 from intbase import InterpreterBase, ErrorType
 
+# Maps every keyword onto the InterpreterBase constant itself. The interpreter compares keyword tokens
+# with "is", which is only safe if each keyword token is that exact object; sys.intern alone would
+# hand back whichever equal string happened to be interned first.
+KEYWORDS = {keyword: keyword for keyword in (
+  InterpreterBase.FUNC_DEF, InterpreterBase.ENDFUNC_DEF, InterpreterBase.WHILE_DEF, InterpreterBase.ENDWHILE_DEF,
+  InterpreterBase.IF_DEF, InterpreterBase.ELSE_DEF, InterpreterBase.ENDIF_DEF, InterpreterBase.RETURN_DEF,
+  InterpreterBase.ASSIGN_DEF, InterpreterBase.FUNCCALL_DEF, InterpreterBase.VAR_DEF, InterpreterBase.LAMBDA_DEF,
+  InterpreterBase.ENDLAMBDA_DEF, InterpreterBase.INT_DEF, InterpreterBase.BOOL_DEF, InterpreterBase.STRING_DEF,
+  InterpreterBase.VOID_DEF, InterpreterBase.OBJECT_DEF, InterpreterBase.REFINT_DEF, InterpreterBase.REFBOOL_DEF,
+  InterpreterBase.REFSTRING_DEF, InterpreterBase.RESULT_DEF, InterpreterBase.TRUE_DEF, InterpreterBase.FALSE_DEF,
+  InterpreterBase.PRINT_DEF, InterpreterBase.INPUT_DEF, InterpreterBase.STRTOINT_DEF)}
+
 # Tokenzies a program, e.g., "assign var + 5 10" --> ["assign","var","+","5","10"] for each line of the input program
 # Input: A list of strings, e.g.: ["func main", " assign x 10", " funccall print x","endfunc"]
 # Output: A list of lists of tokens, e.g.: [["func","main"],["assign","x","10"],["funccall","print","x"],["endfunc"]]
 class Tokenizer:
-  # Performs tokenization and returns the tokenized program
+  # Performs tokenization and returns the tokenized program. Keywords are swapped for the InterpreterBase
+  # constants (see KEYWORDS) so they can be compared with "is", and every other token is interned so
+  # variable names hit the fast path in dictionary lookups
   def tokenize_program(program):
     tokenized_program = []
+    keyword = KEYWORDS.get
     for line_num, line in enumerate(program):
       tokens = Tokenizer._tokenize(line_num, line.rstrip())
-      tokenized_program.append(tokens)
+      tokenized_program.append([keyword(token) or sys.intern(token) for token in tokens])
     return tokenized_program
 
   def _remove_comment(s):
@@ -22,6 +38,12 @@ class Tokenizer:
    return s
 
   def _tokenize(line_num, s):
+    # most lines have no string literals, so any comment starts at the first comment character
+    # and the rest can simply be split on whitespace
+    if '"' not in s:
+      comment_start = s.find(InterpreterBase.COMMENT_DEF)
+      return (s if comment_start < 0 else s[:comment_start]).split()
+
     s = Tokenizer._remove_comment(s)
 
     tokens = []